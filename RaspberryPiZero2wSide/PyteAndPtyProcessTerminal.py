@@ -1,24 +1,69 @@
-import select
+import codecs
+import fcntl
+import os
+import selectors
 import time
-import pyte
-from ptyprocess import PtyProcess
+from typing import TYPE_CHECKING
 
-from config import get_font_config
-from utilities import Utilities
+from config import FONT_CONFIG_TUPLE, PROMPT
+from utilities import SEPARATOR, Utilities
+
+if TYPE_CHECKING:
+    import pyte
+    from ptyprocess import PtyProcess
 
 number_of_rows = 30
 
 
+def _render_lines_python(buffer, rows, columns):
+    """
+    Return the non empty rows of a pyte screen buffer, right stripped.
+
+    screen.display does the same walk but calls wcwidth twice per cell, the cell
+    following a wide char already holds "" so joining the data is enough here.
+
+    pyte only stores the rows and cells that were written, rows missing from the
+    buffer are blank and everything past a row's last stored cell is a space, so
+    neither gets walked (get() also keeps the defaultdict from adding empty rows).
+    """
+    lines = []
+    for row in range(rows):
+        line = buffer.get(row)
+        if not line:
+            continue
+        width = min(max(line) + 1, columns)
+        stripped = "".join([line[col].data for col in range(width)]).rstrip()
+        if stripped:
+            lines.append(stripped)
+    return lines
+
+
+try:
+    # compiled version of the loop above, only there if render_screen.pyx was built
+    from render_screen import render_lines
+except ImportError:
+    render_lines = _render_lines_python
+
+
 class PyteAndPtyProcessTerminal:
 
     def __init__(self, font_size=2):
+        # imported here so setups only using SubprocessTerminal don't pay for loading
+        # pyte (and wcwidth) and ptyprocess at startup
+        import pyte
+        from ptyprocess import PtyProcess
+
         # set variables, most of them will be set below on the switch_font command
         self.stream: pyte.Stream = None
         self.screen: pyte.Screen = None
         self.rows: int
         self.cols: int
+        self.pixels_per_row: int
         self.process: PtyProcess = None
         self.pyte = pyte
+        self._pty_process = PtyProcess
+        self._selector = selectors.DefaultSelector()
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
         self.font_size = font_size
         self.switch_font(font_size)
 
@@ -27,40 +72,48 @@ class PyteAndPtyProcessTerminal:
         Run a command in the PTY and wait for it to complete
         Returns True if successful, False if timeout
         """
-        self.clear
-
-        self.process = PtyProcess.spawn(
+        self.process = self._pty_process.spawn(
             ['/bin/bash', '-c', command],
             dimensions=(self.rows, self.cols)
         )
 
+        # non blocking reads let the drain run until the pty is empty without asking
+        # the selector before every read
+        flags = fcntl.fcntl(self.process.fd, fcntl.F_GETFL)
+        fcntl.fcntl(self.process.fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        # register the pty once, epoll keeps watching it for the whole command
+        self._selector.register(self.process.fd, selectors.EVENT_READ)
+
         start_time = time.time()
 
         try:
-            while self.process.isalive():
+            eof = False
+            # start polling fast for quick commands and back off up to 100ms for
+            # long running silent ones
+            wait = 0.001
+            while not eof:
                 if time.time() - start_time > timeout:
                     Utilities.print_with_indent_and_log_level(f"Command timeout after {timeout}s", 2)
                     self.process.terminate(force=True)
                     return False
 
-                if self.process.fd in select.select([self.process.fd], [], [], 0.1)[0]:
-                    try:
-                        output = self.process.read()
-                        if isinstance(output, bytes):
-                            output = output.decode('utf-8', errors='replace')
-                        self.stream.feed(output)
-                    except EOFError:
+                if self._selector.select(timeout=wait):
+                    eof = self._drain_output()
+                    wait = 0.001
+                else:
+                    # EOF on the pty normally tells us the command is done, only ask the
+                    # process (a waitpid call) while the pty is quiet, something in the
+                    # background could be keeping it open
+                    if not self.process.isalive():
                         break
+                    wait = min(wait * 2, 0.1)
 
-            # Read remaining output
-            try:
-                while True:
-                    output = self.process.read()
-                    if isinstance(output, bytes):
-                        output = output.decode('utf-8', errors='replace')
-                    self.stream.feed(output)
-            except EOFError:
-                pass
+            # Read remaining output, the non-blocking drain stops as soon as nothing is
+            # left, no need to wait for a read to blow up with EOFError
+            if not eof:
+                self._drain_output()
+            self.stream.feed(self._decoder.decode(b'', final=True))
 
             return True
 
@@ -70,19 +123,67 @@ class PyteAndPtyProcessTerminal:
                 self.process.terminate(force=True)
             return False
 
+        finally:
+            self._selector.unregister(self.process.fd)
+
+    def write_marker(self, command):
+        """
+        Put the separator and the command line on the screen before running it.
+
+        Same text `echo` would print through the pty (which turns \n into \r\n),
+        fed to pyte directly so no shell gets spawned just to print it.
+        """
+        self.stream.feed(f"{SEPARATOR}\r\n{PROMPT}{command}   \r\n")
+
+    def _drain_output(self):
+        """
+        Read everything currently waiting on the PTY and feed it to pyte in one go.
+        Returns True once the PTY reached EOF (the command finished)
+        """
+        fd = self.process.fd
+        buf = bytearray()
+        eof = False
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except BlockingIOError:
+                # nothing left for now
+                break
+            except OSError:
+                # linux raises EIO on the master side once the child closed the pty
+                chunk = b''
+            if not chunk:
+                eof = True
+                break
+            buf += chunk
+
+        if buf:
+            if buf.isascii() and not self._decoder.getstate()[0]:
+                # most shell output is plain ascii, skip the utf-8 state machine, only
+                # safe when the decoder isn't holding half a character from last drain
+                self.stream.feed(buf.decode('ascii'))
+            else:
+                # the decoder keeps partial multi-byte sequences around until the next drain
+                self.stream.feed(self._decoder.decode(buf))
+
+        return eof
+
     def switch_font(self, new_font_size):
         """Switch to new font, recreate PTY, redraw screen"""
         Utilities.print_with_indent(f"Switching to font {new_font_size}...")
         self.font_size = new_font_size
-        # Get new font dimensions
-        font_config = get_font_config().fontConfiguration[new_font_size]
-        new_cols = font_config[1]
-        new_rows = font_config[2]
+        # Get new font dimensions, kept around so nobody has to look them up again
+        font_config = FONT_CONFIG_TUPLE[new_font_size]
+        self._font_config = font_config
+        new_cols = font_config.cols
+        new_rows = font_config.rows_visible
 
         # Recreate terminal with new dimensions
         self.cols = new_cols
         self.rows = new_rows
+        self.pixels_per_row = font_config.pixels_per_row
 
+        # Resize the one screen, what's on it is kept across font switches
         if self.screen is not None:
             self.screen.resize(number_of_rows, new_cols)
         else:
@@ -90,26 +191,14 @@ class PyteAndPtyProcessTerminal:
             self.stream = self.pyte.Stream(self.screen)
 
         Utilities.print_with_indent_and_log_level(
-            f"Font {new_font_size} active ({new_cols} cols × {font_config[2]} rows visible)", 2)
+            f"Font {new_font_size} active ({new_cols} cols × {new_rows} rows visible)", 2)
 
     def get_screen_new_lines(self):
-        lines = []
-        for row in range(self.screen.lines):
-            line = ""
-            for col in range(self.screen.columns):
-                char = self.screen.buffer[row][col].data
-                line += char
-            stripped = line.rstrip()
-            if stripped:
-                lines.append(stripped)
+        lines = render_lines(self.screen.buffer, self.screen.lines, self.screen.columns)
 
         Utilities.print_with_indent_and_log_level(f"Screen contents: {lines}", 2)
 
-        try:
-            index = len(lines) - 1 - lines[::-1].index("=========================")
-            new_lines = lines[index + 1:]
-        except ValueError:
-            new_lines = lines
+        new_lines = Utilities.lines_after_last_separator(lines)
 
         Utilities.print_with_indent_and_log_level(f"New contents: {new_lines}", 2)
 
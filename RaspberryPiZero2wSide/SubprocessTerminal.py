@@ -1,7 +1,8 @@
 import subprocess
 import os
 import time
-from config import get_font_config, PROMPT
+from itertools import chain
+from config import FONT_CONFIG_TUPLE, PROMPT
 from utilities import Utilities
 
 number_of_rows = 30
@@ -13,6 +14,7 @@ class SubprocessTerminal:
         self.font_size = font_size
         self.rows: int = 0
         self.cols: int = 0
+        self.pixels_per_row: int = 0
         self.last_output_lines = []
         self.switch_font(font_size)
 
@@ -34,22 +36,21 @@ class SubprocessTerminal:
                 ['/bin/bash', '-c', command],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
                 env=my_env
             )
 
             try:
                 stdout, stderr = process.communicate(timeout=timeout)
 
-                # Combine stdout and stderr
-                output = f"\n{PROMPT} {command}\n" + stdout
-                if stderr:
-                    output += stderr
+                # Decode each stream once, a single large decode is much cheaper than
+                # letting a TextIOWrapper decode it chunk by chunk
+                stdout = stdout.decode('utf-8', errors='replace')
+                stderr = stderr.decode('utf-8', errors='replace') if stderr else ''
 
-                # Split into lines and store
-                self.last_output_lines = self.wrap_lines(output.splitlines())
-
-                # now let's break lines into multiple lines IF the line is longer than the self.cols value
+                # Split stdout and stderr into lines without building the combined
+                # output, then break the ones longer than self.cols in the same pass
+                self.last_output_lines = self.wrap_lines(
+                    chain((f"{PROMPT} {command}",), stdout.splitlines(), stderr.splitlines()))
 
                 return process.returncode == 0
 
@@ -67,29 +68,41 @@ class SubprocessTerminal:
             )
             return False
 
+    def write_marker(self, command):
+        """
+        Nothing to do, run_command starts from an empty output and already puts the
+        command line at the top of it
+        """
+
     def wrap_lines(self, lines):
-        new_list = []
+        """List of the given lines (any iterable), the ones longer than self.cols chopped"""
+        return list(self._iter_wrap(lines))
+
+    def _iter_wrap(self, lines):
+        """Yield the given lines, chopping the ones longer than self.cols"""
+        cols = self.cols
         for line in lines:
-            if len(line) <= self.cols:
-                new_list.append(line)
+            if len(line) <= cols:
+                yield line
             else:
-                # Chop the string into chunks of length x
-                for i in range(0, len(line), self.cols):
-                    new_list.append(line[i: i + self.cols])
-        return new_list
+                # Chop the string into chunks of length cols
+                for i in range(0, len(line), cols):
+                    yield line[i: i + cols]
 
     def switch_font(self, new_font_size):
         """Switch to new font, update dimensions"""
         Utilities.print_with_indent(f"Switching to font {new_font_size}...")
         self.font_size = new_font_size
 
-        # Get new font dimensions
-        font_config = get_font_config(new_font_size)
-        new_cols = font_config[1]
-        new_rows = font_config[2]
+        # Get new font dimensions, kept around so nobody has to look them up again
+        font_config = FONT_CONFIG_TUPLE[new_font_size]
+        self._font_config = font_config
+        new_cols = font_config.cols
+        new_rows = font_config.rows_visible
 
         self.cols = new_cols
         self.rows = new_rows
+        self.pixels_per_row = font_config.pixels_per_row
 
         Utilities.print_with_indent_and_log_level(
             f"Font {new_font_size} active ({new_cols} cols × {new_rows} rows visible)", 2
@@ -99,15 +112,11 @@ class SubprocessTerminal:
         """
         Return the output lines, attempting to find content after separator
         """
-        lines = [line.rstrip() for line in self.last_output_lines if line.rstrip()]
+        lines = [line for line in (raw.rstrip() for raw in self.last_output_lines) if line]
 
         Utilities.print_with_indent_and_log_level(f"Screen contents: {lines}", 2)
 
-        try:
-            index = len(lines) - 1 - lines[::-1].index("=========================")
-            new_lines = lines[index + 1:]
-        except ValueError:
-            new_lines = lines
+        new_lines = Utilities.lines_after_last_separator(lines)
 
         Utilities.print_with_indent_and_log_level(f"New contents: {new_lines}", 2)
 
@@ -4,7 +4,10 @@ Unit tests for Smart Response XE Terminal communication
 Tests the screen update logic, scroll optimization, and line comparison.
 """
 
+import os
+import threading
 import unittest
+from collections import deque
 from unittest.mock import MagicMock, patch, call
 import sys
 
@@ -12,8 +15,8 @@ import sys
 sys.modules['pigpio'] = MagicMock()
 sys.modules['serial'] = MagicMock()
 
-from config import FONT_CONFIGURATION, PROMPT, TERMINAL_HISTORY_ROWS
-from protocol import PacketParser
+from config import ARDUINO_RX_BUFFER_SIZE, FONT_CONFIGURATION, PROMPT, TERMINAL_HISTORY_ROWS
+from protocol import PacketParser, xor_all
 
 
 class MockArduinoSerial:
@@ -45,7 +48,7 @@ class TestScreenController(unittest.TestCase):
         # Mock the methods we want to track
         self.screen.scroll_screen_up = MagicMock()
         self.screen.send_line = MagicMock()
-        self.screen._lines = []
+        self.screen._lines = deque(maxlen=TERMINAL_HISTORY_ROWS)
 
     def test_scroll_logic_with_new_lines(self):
         """Test that scrolling works correctly with fewer new lines than screen rows"""
@@ -53,7 +56,7 @@ class TestScreenController(unittest.TestCase):
         font_id = 2
         font_config = FONT_CONFIGURATION[font_id]
 
-        self.screen._lines = ["Old Line 1"]
+        self.screen.lines = ["Old Line 1"]
         new_lines = ["New Line A", "New Line B"]
 
         self.screen.send_new_lines(new_lines, font_id=font_id)
@@ -69,7 +72,7 @@ class TestScreenController(unittest.TestCase):
         """Test that only changed lines are sent when screen is full"""
         font_id = 2
 
-        self.screen._lines = [
+        self.screen.lines = [
             'sddET39uU8237088',
             'z2345678901234567890123456789012',
             '34567890123456789012345678901234',
@@ -139,7 +142,7 @@ class TestScreenController(unittest.TestCase):
         """Test that no lines are sent when content is identical"""
         font_id = 2
 
-        self.screen._lines = [
+        self.screen.lines = [
             'sddET39uU8237088',
             'z2345678901234567890123456789012',
             '34567890123456789012345678901234',
@@ -208,7 +211,7 @@ class TestScreenController(unittest.TestCase):
         font_id = 2
         font_config = FONT_CONFIGURATION[font_id]
 
-        self.screen._lines = []
+        self.screen.lines = []
 
         new_lines = [
             'CMD> a',
@@ -237,7 +240,7 @@ class TestScreenController(unittest.TestCase):
         font_config = FONT_CONFIGURATION[font_id]
         rows_in_screen = font_config[2] - 1  # 8 - 1 = 7
 
-        self.screen._lines = []
+        self.screen.lines = []
 
         new_lines = [
             'CMD> a',
@@ -278,7 +281,7 @@ class TestScreenController(unittest.TestCase):
         """Test full screen replacement when buffer already has content"""
         font_id = 2
 
-        self.screen._lines = [
+        self.screen.lines = [
             'bla',
             'more bla',
             'even more bla',
@@ -319,6 +322,194 @@ class TestScreenController(unittest.TestCase):
         # Should NOT scroll when replacing entire screen
         self.screen.scroll_screen_up.assert_not_called()
 
+    def test_history_is_capped(self):
+        """Test that the line buffer keeps at most TERMINAL_HISTORY_ROWS lines"""
+        font_id = 2
+        self.screen.lines = []
+
+        new_lines = [f'line {i}' for i in range(TERMINAL_HISTORY_ROWS + 20)]
+        self.screen.send_new_lines(new_lines, font_id=font_id)
+
+        self.assertEqual(self.screen.lines_snapshot(), new_lines[-TERMINAL_HISTORY_ROWS:])
+
+    def test_resend_screen_sends_last_lines_bottom_up(self):
+        """Test that resend_screen redraws the newest lines from the bottom"""
+        font_id = 2
+        self.screen.lines = ['a', 'b', 'c']
+
+        self.screen.resend_screen(font_id)
+
+        expected_calls = [
+            call('c', 6, font_id),
+            call('b', 5, font_id),
+            call('a', 4, font_id),
+        ]
+        self.assertEqual(self.screen.send_line.call_args_list, expected_calls)
+
+
+class RecordingArduinoSerial(MockArduinoSerial):
+    """Mock ArduinoSerial that keeps every chunk of bytes sent"""
+
+    def __init__(self, port):
+        super().__init__(port)
+        self.sent = []
+        self.ready_waits = 0
+        # wait_for_ready calls (counting from 1) that time out
+        self.missing_readies = set()
+
+    def send(self, data):
+        self.sent.append(bytes(data))
+        return True
+
+    def wait_for_ready(self, timeout=1.0, process_callback=None):
+        self.ready_waits += 1
+        return self.ready_waits not in self.missing_readies
+
+
+class TestScreenControllerCommands(unittest.TestCase):
+    """Test the bytes the screen controller sends to the Arduino"""
+
+    def setUp(self):
+        from screen_controller import ScreenController
+        self.mock_serial = RecordingArduinoSerial("/dev/fake")
+        self.screen = ScreenController(self.mock_serial)
+
+    def test_send_line_command(self):
+        """Test the write text command for a row"""
+        font_id = 2
+        self.screen.send_line('hello', 3, font_id)
+
+        # y = 3 * 17 + 0, white on black, padding stripped before sending
+        self.assertEqual(self.mock_serial.sent,
+                         [bytes([0x02, 51, font_id, 3, 0, 5]) + b'hello'])
+
+    def test_send_line_truncates_to_font_width(self):
+        """Test that lines longer than the font width are cut"""
+        font_id = 3
+        self.screen.send_line('x' * 40, 0, font_id)
+
+        cols = FONT_CONFIGURATION[font_id][1]
+        self.assertEqual(self.mock_serial.sent,
+                         [bytes([0x02, 0, font_id, 3, 0, cols]) + b'x' * cols])
+
+    def test_send_line_replaces_non_ascii(self):
+        """Test that characters the Arduino can't draw are sent as '?'"""
+        font_id = 2
+        self.screen.send_line('caf\u00e9 \u2192 ok', 0, font_id)
+
+        self.assertEqual(self.mock_serial.sent,
+                         [bytes([0x02, 0, font_id, 3, 0, 9]) + b'caf? ? ok'])
+
+    def test_update_prompt_uses_last_row(self):
+        """Test that the prompt is drawn on the last visible row"""
+        self.screen.update_prompt('ls ', 1)
+
+        # 17 rows * 8px - 8px = 128
+        self.assertEqual(self.mock_serial.sent,
+                         [bytes([0x07, 128, 1, 3, 0, 2]) + b'ls'])
+
+    def test_unchanged_row_not_resent(self):
+        """Test that a row is only sent again after it changes or the screen is cleared"""
+        self.screen.send_line('ls', 3, 1)
+        self.screen.send_line('ls', 3, 1)
+        self.assertEqual(len(self.mock_serial.sent), 1)
+
+        self.screen.send_line('ls -l', 3, 1)
+        self.assertEqual(len(self.mock_serial.sent), 2)
+
+        self.screen.clear_screen(clear_buffer=False)
+        self.screen.send_line('ls -l', 3, 1)
+        self.assertEqual(len(self.mock_serial.sent), 4)
+
+    def test_prompt_always_sent(self):
+        """Test that the prompt goes out even when unchanged, the Arduino clears its input on it"""
+        self.screen.update_prompt('', 1)
+        self.screen.update_prompt('', 1)
+
+        self.assertEqual(self.mock_serial.sent, [bytes([0x07, 128, 1, 3, 0, 0])] * 2)
+
+    def test_prompt_sent_after_unchanged_output(self):
+        """Test that rerunning a command with the same output still resets the prompt"""
+        font_id = 2
+        rows_in_screen = FONT_CONFIGURATION[font_id][2] - 1
+        output = [f'line {i}' for i in range(rows_in_screen)]
+        self.screen.send_new_lines(list(output), font_id)
+        self.screen.update_prompt('', font_id)
+        self.mock_serial.sent.clear()
+
+        self.screen.send_new_lines(list(output), font_id)
+        self.screen.update_prompt('', font_id)
+
+        self.assertEqual(self.mock_serial.sent, [bytes([0x07, 119, font_id, 3, 0, 0])])
+
+    def test_new_lines_sent_in_one_batch(self):
+        """Test that the scroll and the new lines go out in a single write"""
+        font_id = 2
+        self.screen.send_new_lines(['one', 'two'], font_id)
+
+        self.assertEqual(self.mock_serial.sent, [
+            bytes([0x03, 34]) +
+            bytes([0x02, 102, font_id, 3, 0, 3]) + b'two' +
+            bytes([0x02, 85, font_id, 3, 0, 3]) + b'one'])
+        # one ready signal per command
+        self.assertEqual(self.mock_serial.ready_waits, 3)
+
+    def test_batch_fits_arduino_buffer(self):
+        """Test that batched writes are split to fit the Arduino receive buffer"""
+        font_id = 3
+        # -1 for the prompt line
+        rows_in_screen = FONT_CONFIGURATION[font_id][2] - 1
+        self.screen.lines = ['y' * 40] * rows_in_screen
+        self.screen.resend_screen(font_id)
+
+        self.assertGreater(len(self.mock_serial.sent), 1)
+        for chunk in self.mock_serial.sent:
+            self.assertLessEqual(len(chunk), ARDUINO_RX_BUFFER_SIZE)
+        self.assertEqual(self.mock_serial.ready_waits, rows_in_screen)
+
+    def test_resend_screen_clear_first_same_write(self):
+        """Test that clearing before a redraw goes out in the same write as the lines"""
+        font_id = 2
+        self.screen.lines = ['one', 'two']
+        self.screen.resend_screen(font_id, clear_first=True)
+
+        self.assertEqual(self.mock_serial.sent, [
+            bytes([0x06]) +
+            bytes([0x02, 102, font_id, 3, 0, 3]) + b'two' +
+            bytes([0x02, 85, font_id, 3, 0, 3]) + b'one'])
+        self.assertEqual(self.mock_serial.ready_waits, 3)
+        # the line buffer is kept for the redraw
+        self.assertEqual(list(self.screen.lines), ['one', 'two'])
+
+    def test_batch_missing_ready_resends_rest(self):
+        """Test that a lost ready stops the wait and the rest of the batch is sent again"""
+        font_id = 2
+        self.mock_serial.missing_readies = {2}
+        self.screen.send_new_lines(['one', 'two'], font_id)
+
+        two = bytes([0x02, 102, font_id, 3, 0, 3]) + b'two'
+        one = bytes([0x02, 85, font_id, 3, 0, 3]) + b'one'
+        self.assertEqual(self.mock_serial.sent, [bytes([0x03, 34]) + two + one, two, one])
+        # scroll answered, the wait for 'two' timed out, then one per resent command
+        self.assertEqual(self.mock_serial.ready_waits, 4)
+
+    def test_batch_no_answer_gives_up(self):
+        """Test that an Arduino that stops answering doesn't stall once per command"""
+        font_id = 2
+        self.mock_serial.missing_readies = {1, 2}
+        self.screen.send_new_lines(['one', 'two'], font_id)
+
+        self.assertEqual(len(self.mock_serial.sent), 2)
+        self.assertEqual(self.mock_serial.ready_waits, 2)
+        # rows are sent again on the next update
+        self.assertEqual(self.screen._row_packets, {})
+
+    def test_commands_outside_batch_sent_immediately(self):
+        """Test that a command is sent right away when not batching"""
+        self.screen.clear_screen()
+        self.assertEqual(self.mock_serial.sent, [bytes([0x06])])
+        self.assertEqual(self.mock_serial.ready_waits, 1)
+
 
 class TestPacketParser(unittest.TestCase):
     """Test the protocol packet parser"""
@@ -432,6 +623,207 @@ class TestPacketParser(unittest.TestCase):
         p3 = self.parser.feed(0xFC)
         self.assertEqual(p3['type'], 'ready')
 
+    def test_xor_all_matches_byte_loop(self):
+        """Test the folded checksum against a plain byte by byte XOR"""
+        for size in range(0, 256):
+            data = bytes((i * 37 + size) & 0xFF for i in range(size))
+            expected = 0
+            for c in data:
+                expected ^= c
+            self.assertEqual(xor_all(data), expected)
+
+    def test_feed_bytes_multiple_packets(self):
+        """Test parsing a whole chunk with several packets at once"""
+        checksum = 0xF8 ^ 5
+        for c in b'hello':
+            checksum ^= c
+        data = (bytes([0xFC, 0xFF, 0xFD, 0x41, 0xBC, 0xFE, 0xFA]) + b'debug msg' +
+                bytes([0xFB, 0xF8, 5]) + b'hello' + bytes([checksum, 0xF9]))
+
+        packets = self.parser.feed_bytes(data)
+
+        self.assertEqual(packets, [
+            {'type': 'ready'},
+            {'type': 'key', 'key': 0x41},
+            {'type': 'debug', 'message': 'debug msg'},
+            {'type': 'line', 'data': 'hello'},
+        ])
+
+    def test_feed_bytes_packet_split_across_chunks(self):
+        """Test that a packet split between chunks is still parsed"""
+        checksum = 0xF8 ^ 5
+        for c in b'hello':
+            checksum ^= c
+
+        self.assertEqual(self.parser.feed_bytes(bytes([0xFA]) + b'deb'), [])
+        packets = self.parser.feed_bytes(b'ug msg' + bytes([0xFB, 0xF8, 5]) + b'he')
+        self.assertEqual(packets, [{'type': 'debug', 'message': 'debug msg'}])
+
+        self.assertEqual(self.parser.feed_bytes(b'llo'), [])
+        packets = self.parser.feed_bytes(bytes([checksum, 0xF9]))
+        self.assertEqual(packets, [{'type': 'line', 'data': 'hello'}])
+
+    def test_feed_bytes_matches_feed(self):
+        """Test that feed_bytes gives the same packets as feeding byte by byte"""
+        data = bytes([0xFC, 0x42, 0xFD, 0x41, 0x00, 0xFE, 0xF8, 3]) + b'abc' + bytes([0x00, 0xF9, 0xFC])
+
+        byte_parser = PacketParser()
+        expected = [p for p in (byte_parser.feed(b) for b in data) if p]
+
+        self.assertEqual(self.parser.feed_bytes(data), expected)
+
+    def test_debug_message_longer_than_buffer(self):
+        """Test that debug messages longer than a line packet grow the buffer"""
+        message = 'x' * 600
+        data = bytes([0xFA]) + message.encode('ascii') + bytes([0xFB])
+
+        self.assertEqual(self.parser.feed_bytes(data), [{'type': 'debug', 'message': message}])
+
+        byte_parser = PacketParser()
+        packets = [p for p in (byte_parser.feed(b) for b in data) if p]
+        self.assertEqual(packets, [{'type': 'debug', 'message': message}])
+
+
+class TestArduinoSerial(unittest.TestCase):
+    """Test the low-level serial connection"""
+
+    def setUp(self):
+        from serial_connection import ArduinoSerial
+        # The serial port is a pipe, bytes written to write_fd arrive as if the
+        # Arduino had sent them
+        self.read_fd, self.write_fd = os.pipe()
+        sys.modules['serial'].Serial.return_value.fileno.return_value = self.read_fd
+        self.arduino = ArduinoSerial("/dev/fake")
+
+    def tearDown(self):
+        self.arduino.close()
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+    def test_disconnect_raises(self):
+        """Test that a hung up port raises instead of reading as no data"""
+        os.close(self.write_fd)
+        # keep tearDown's close working
+        self.write_fd = os.open(os.devnull, os.O_WRONLY)
+
+        with patch.object(sys.modules['serial'], 'SerialException', OSError):
+            self.assertTrue(self.arduino.wait_for_data(timeout=0.01))
+            with self.assertRaises(OSError):
+                self.arduino.read_all_packets()
+
+    def test_wait_for_data(self):
+        """Test that waiting wakes up only once the serial fd has data"""
+        self.assertFalse(self.arduino.wait_for_data(timeout=0.01))
+
+        os.write(self.write_fd, bytes([0xFC]))
+        self.assertTrue(self.arduino.wait_for_data(timeout=0.01))
+
+    def test_read_packet_reads_everything_waiting_at_once(self):
+        """Test that packets from a single read are handed out one at a time"""
+        os.write(self.write_fd, bytes([0xFC, 0xFD, 0x41, 0x41 ^ 0xFD, 0xFE]))
+
+        self.assertEqual(self.arduino.read_packet(), {'type': 'ready'})
+        # the key is already read, nothing is left on the fd
+        self.assertTrue(self.arduino.wait_for_data(timeout=0))
+        self.assertEqual(self.arduino.read_packet(), {'type': 'key', 'key': 0x41})
+        self.assertIsNone(self.arduino.read_packet())
+
+    def test_read_all_packets_single_read(self):
+        """Test that read_all_packets parses everything waiting"""
+        os.write(self.write_fd, bytes([0xFC, 0xFA]) + b'dbg' + bytes([0xFB, 0xFC]))
+
+        self.assertEqual(self.arduino.read_all_packets(), [
+            {'type': 'ready'}, {'type': 'debug', 'message': 'dbg'}, {'type': 'ready'}])
+        self.assertEqual(self.arduino.read_all_packets(), [])
+
+    def test_packet_split_across_reads(self):
+        """Test that a packet arriving in two pieces is still parsed"""
+        os.write(self.write_fd, bytes([0xFD, 0x41]))
+        self.assertIsNone(self.arduino.read_packet())
+
+        os.write(self.write_fd, bytes([0x41 ^ 0xFD, 0xFE]))
+        self.assertEqual(self.arduino.read_packet(), {'type': 'key', 'key': 0x41})
+
+    def test_wait_for_ready(self):
+        """Test that a ready packet ends the wait"""
+        threading.Timer(0.01, os.write, (self.write_fd, bytes([0xFC]))).start()
+
+        self.assertTrue(self.arduino.wait_for_ready(timeout=1.0))
+
+    def test_keys_during_wait_for_ready_are_kept(self):
+        """Test that keys arriving before the ready signal are read afterwards"""
+        os.write(self.write_fd, bytes([0xFD, 0x41, 0x41 ^ 0xFD, 0xFE, 0xFC]))
+
+        self.assertTrue(self.arduino.wait_for_ready(timeout=1.0))
+        self.assertEqual(self.arduino.read_all_packets(), [{'type': 'key', 'key': 0x41}])
+
+    def test_wait_for_ready_timeout(self):
+        """Test that waiting for ready gives up at the deadline"""
+        self.assertFalse(self.arduino.wait_for_ready(timeout=0.05))
+
+    def test_send_when_signal_already_low(self):
+        """Test that data goes out right away when the Arduino is ready"""
+        self.arduino._pi.read.return_value = 0
+
+        self.assertTrue(self.arduino.send(b'\x06'))
+        self.arduino._ser.write.assert_called_with(b'\x06')
+
+    def test_send_waits_for_signal_edge(self):
+        """Test that send sleeps until the signal pin goes LOW"""
+        self.arduino._pi.read.return_value = 1
+        on_edge = self.arduino._pi.callback.call_args[0][2]
+
+        def pin_goes_low():
+            self.arduino._pi.read.return_value = 0
+            on_edge(27, 0, 0)
+
+        threading.Timer(0.01, pin_goes_low).start()
+
+        self.assertTrue(self.arduino.send(b'\x06'))
+        self.arduino._ser.write.assert_called_with(b'\x06')
+
+    def test_send_stale_edge_not_written(self):
+        """Test that an edge doesn't send anything while the pin reads HIGH again"""
+        self.arduino._pi.read.return_value = 1
+        self.arduino._ser.write.reset_mock()
+        on_edge = self.arduino._pi.callback.call_args[0][2]
+        threading.Timer(0.01, on_edge, (27, 0, 0)).start()
+
+        self.assertFalse(self.arduino.send(b'\x06'))
+        self.arduino._ser.write.assert_not_called()
+
+    def test_send_timeout(self):
+        """Test that send gives up when the signal pin never goes LOW"""
+        self.arduino._pi.read.return_value = 1
+        self.arduino._ser.write.reset_mock()
+
+        self.assertFalse(self.arduino.send(b'\x06'))
+        self.arduino._ser.write.assert_not_called()
+
+
+class TestSerialCommunicationToArduino(unittest.TestCase):
+    """Test the keyboard loop of the high-level interface"""
+
+    def setUp(self):
+        from serialCommunicationsToArduino import SerialCommunicationToArduino
+        self.comm = SerialCommunicationToArduino.__new__(SerialCommunicationToArduino)
+        self.comm._arduino = MagicMock()
+        self.comm._arduino.wait_for_data.return_value = True
+        self.comm._screen = MagicMock()
+
+    def test_keys_in_one_read_redraw_prompt_once(self):
+        """Test that keys arriving together are drawn with a single prompt update"""
+        from keyboard_handler import KeyboardHandler
+        self.comm._arduino.read_all_packets.side_effect = [
+            [{'type': 'key', 'key': ord('l')}, {'type': 'key', 'key': ord('s')}],
+            [{'type': 'key', 'key': 0x08}],  # Enter
+        ]
+
+        result = self.comm.get_command_from_keyboard(1, KeyboardHandler())
+
+        self.assertEqual(result, {"type": "command", "value": "ls"})
+        self.comm._screen.update_prompt.assert_called_once_with('ls ', 1)
+
 
 class TestKeyboardHandler(unittest.TestCase):
     """Test the keyboard handler"""
@@ -483,6 +875,12 @@ class TestKeyboardHandler(unittest.TestCase):
         result = self.handler.process_key(ord('c'))
         self.assertEqual(result, {"action": "clear_buffer"})
 
+    def test_sym_clear_uppercase(self):
+        """Test Sym + uppercase C also clears the buffer"""
+        self.handler.process_key(0x11)  # KEY_MODIFIER_SYM
+        result = self.handler.process_key(ord('C'))
+        self.assertEqual(result, {"action": "clear_buffer"})
+
     def test_modifier_resets_after_use(self):
         """Test that modifier state resets after one key"""
         # Activate shift
@@ -494,6 +892,144 @@ class TestKeyboardHandler(unittest.TestCase):
         result = self.handler.process_key(0x08)  # DEL
         self.assertEqual(result, {"action": "enter"})  # Not backspace
 
+    def test_actions_are_shared_and_read_only(self):
+        """Test that the same action object comes back every time and can't be changed"""
+        self.handler.process_key(0x10)  # Shift
+        first = self.handler.process_key(0x32)
+        self.handler.process_key(0x10)  # Shift
+        second = self.handler.process_key(0x32)
+
+        self.assertIs(first, second)
+        self.assertIs(self.handler.process_key(0x08), self.handler.process_key(0x08))
+        with self.assertRaises(TypeError):
+            first["font"] = 0
+
+
+
+class TestPyteAndPtyProcessTerminal(unittest.TestCase):
+    """Test the pyte terminal backend without running commands"""
+
+    def setUp(self):
+        from PyteAndPtyProcessTerminal import PyteAndPtyProcessTerminal
+        self.terminal = PyteAndPtyProcessTerminal(font_size=2)
+
+    def test_switch_font_keeps_screen(self):
+        """Test that switching fonts resizes the screen and keeps what's on it"""
+        self.terminal.stream.feed("first\r\nsecond\r\n")
+        self.terminal.switch_font(1)
+
+        self.assertEqual(self.terminal.screen.columns, FONT_CONFIGURATION[1][1])
+        self.assertEqual(self.terminal.get_screen_new_lines(), ['first', 'second'])
+
+    def drain_pipe(self):
+        """Point the terminal at a non blocking pipe instead of a spawned pty"""
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        self.addCleanup(os.close, read_fd)
+        self.terminal.process = MagicMock(fd=read_fd)
+        return write_fd
+
+    def test_drain_reads_until_empty(self):
+        """Test that a drain feeds everything waiting and stops without EOF"""
+        write_fd = self.drain_pipe()
+        self.addCleanup(os.close, write_fd)
+        os.write(write_fd, b"one\r\n")
+        os.write(write_fd, b"two\r\n")
+
+        self.assertFalse(self.terminal._drain_output())
+        self.assertEqual(self.terminal.get_screen_new_lines(), ['one', 'two'])
+
+    def test_drain_utf8_split_across_reads(self):
+        """Test that a character split between two drains is decoded once it's complete"""
+        write_fd = self.drain_pipe()
+        self.addCleanup(os.close, write_fd)
+
+        os.write(write_fd, b"caf\xc3")
+        self.terminal._drain_output()
+        # the decoder holds the half character, the ascii fast path must not be used
+        os.write(write_fd, b"\xa9\r\nok\r\n")
+        self.terminal._drain_output()
+
+        self.assertEqual(self.terminal.get_screen_new_lines(), ['caf\u00e9', 'ok'])
+
+    def test_drain_ascii_after_half_character(self):
+        """Test that plain ascii after a cut off character still goes through the decoder"""
+        write_fd = self.drain_pipe()
+        self.addCleanup(os.close, write_fd)
+
+        os.write(write_fd, b"a\xc3")
+        self.terminal._drain_output()
+        os.write(write_fd, b"b\r\n")
+        self.terminal._drain_output()
+
+        self.assertEqual(self.terminal.get_screen_new_lines(), ['a\ufffdb'])
+
+    def test_drain_eof(self):
+        """Test that the drain reports EOF once the other side is closed"""
+        write_fd = self.drain_pipe()
+        os.write(write_fd, b"last\r\n")
+        os.close(write_fd)
+
+        self.assertTrue(self.terminal._drain_output())
+        self.assertEqual(self.terminal.get_screen_new_lines(), ['last'])
+
+    def test_run_command(self):
+        """Test a real command through the pty, up to EOF and the final decoder flush"""
+        # ends in half a utf-8 character, only the final flush turns it into U+FFFD
+        self.assertTrue(self.terminal.run_command("printf 'one\\ntwo\\n\\303'"))
+
+        self.assertEqual(self.terminal.get_screen_new_lines(), ['one', 'two', '\ufffd'])
+
+    def test_render_lines_matches_display(self):
+        """Test that the sparse render gives the same lines as pyte's display"""
+        from PyteAndPtyProcessTerminal import _render_lines_python, render_lines
+        self.terminal.stream.feed("hello\r\n\r\n  indented   \r\n"
+                                  "\u65e5\u672c wide\r\n\x1b[20;5Hmoved\r\ntab\tafter")
+        screen = self.terminal.screen
+        expected = [line.rstrip() for line in screen.display if line.rstrip()]
+
+        self.assertEqual(_render_lines_python(screen.buffer, screen.lines, screen.columns),
+                         expected)
+        self.assertEqual(render_lines(screen.buffer, screen.lines, screen.columns), expected)
+
+    def test_write_marker_separates_new_lines(self):
+        """Test that only the lines after the last marker are new"""
+        self.terminal.stream.feed("old output\r\n")
+        self.terminal.write_marker("ls")
+        self.terminal.stream.feed("new output\r\n")
+
+        self.assertEqual(self.terminal.get_screen_new_lines(), [f"{PROMPT}ls", 'new output'])
+
+
+
+class TestSubprocessTerminal(unittest.TestCase):
+    """Test the subprocess terminal backend"""
+
+    def test_run_command_wraps_long_lines(self):
+        """Test that output lines longer than the font width are chopped in order"""
+        from SubprocessTerminal import SubprocessTerminal
+        terminal = SubprocessTerminal(font_size=3)
+        cols = FONT_CONFIGURATION[3][1]
+
+        self.assertTrue(terminal.run_command(f"echo short; printf 'x%.0s' $(seq {cols + 5}); "
+                                             f"echo; echo err >&2"))
+
+        lines = terminal.last_output_lines
+        self.assertEqual(lines[-4:], ['short', 'x' * cols, 'x' * 5, 'err'])
+        self.assertTrue(all(len(line) <= cols for line in lines))
+
+
+    """Test the shared line helpers"""
+
+    def test_lines_after_last_separator(self):
+        """Test that only the lines after the last separator are kept"""
+        from utilities import SEPARATOR, Utilities
+        lines = ['old', SEPARATOR, 'older new', SEPARATOR, 'new', 'newer']
+
+        self.assertEqual(Utilities.lines_after_last_separator(lines), ['new', 'newer'])
+        self.assertEqual(Utilities.lines_after_last_separator(['a', 'b']), ['a', 'b'])
+        self.assertEqual(Utilities.lines_after_last_separator(['a', SEPARATOR]), [])
+
 
 if __name__ == '__main__':
     unittest.main()
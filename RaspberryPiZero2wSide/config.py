@@ -11,7 +11,7 @@ The screen is 136 pixels tall. Different fonts divide this differently:
 - Small fonts (8px): 136/8 = 17 rows (divides evenly)
 - Large fonts (17px): 136/17 = 8 rows (divides evenly)
 
-Font configuration: [font_id, cols, rows_visible, pixels_per_row, padding]
+Font configuration: FontConfig(font_id, cols, rows_visible, pixels_per_row, padding)
 
 The padding field was added because some font/row combinations don't
 divide evenly into 136 pixels, causing the last row to be offset.
@@ -20,6 +20,8 @@ divide evenly into 136 pixels, causing the last row to be offset.
 poor soul that decides to work on this have this info"
 """
 
+from typing import NamedTuple
+
 # =============================================================================
 # SERIAL CONFIGURATION
 # =============================================================================
@@ -34,6 +36,11 @@ TIMEOUT_WAITING_FOR_SIGNAL_TO_TRANSFER = 100 / 1000  # 100ms
 # GPIO pin number (BCM numbering) for the Arduino ready signal
 SIGNAL_PIN_NUMBER_ON_GPIO_NUMBERING = 27
 
+# Bytes the Arduino can hold before it gets to process them. SoftClockSerial uses
+# a 128 byte ring buffer (127 usable) and drops anything past that, the hardware
+# serial buffer is 64 bytes. Batched screen commands are flushed before going over.
+ARDUINO_RX_BUFFER_SIZE = 127 if USING_SOFT_SERIAL else 63
+
 # Configuration
 VERTICAL_SCREEN_SIZE = 136
 
@@ -90,7 +97,7 @@ LINE_END_MARKER = 0xF9
 # FONT CONFIGURATION
 # =============================================================================
 
-# Font configuration: [font_id, cols, rows_visible, pixels_per_row, padding]
+# Font configuration: FontConfig(font_id, cols, rows_visible, pixels_per_row, padding)
 #
 # - font_id: Matches Arduino FONT_* constants
 # - cols: Characters per line
@@ -104,26 +111,40 @@ LINE_END_MARKER = 0xF9
 # Last line (prompt) Y position:
 #   y = rows_visible * pixels_per_row + padding - pixels_per_row
 
+class FontConfig(NamedTuple):
+    """One FONT_CONFIGURATION entry, still indexable like the old lists"""
+    font_id: int
+    cols: int
+    rows_visible: int
+    pixels_per_row: int
+    padding: int
+
+
 FONT_NORMAL = 0
 FONT_SMALL = 1
 FONT_MEDIUM = 2
 FONT_LARGE = 3
 
 FONT_CONFIGURATION = [
-    # [font_id, cols, rows_visible, pixels_per_row, padding]
-    [FONT_NORMAL, 52, 17, 8, 0],  # Normal: 52 chars × 17 rows × 8px
-    [FONT_SMALL, 64, 17, 8, 0],  # Small: 64 chars × 17 rows × 8px
-    [FONT_MEDIUM, 32, 8, 17, 0],  # Medium: 32 chars × 8 rows × 17px
-    [FONT_LARGE, 25, 8, 17, 0],  # Large: 25 chars × 8 rows × 17px
+    # FontConfig(font_id, cols, rows_visible, pixels_per_row, padding)
+    FontConfig(FONT_NORMAL, 52, 17, 8, 0),  # Normal: 52 chars × 17 rows × 8px
+    FontConfig(FONT_SMALL, 64, 17, 8, 0),  # Small: 64 chars × 17 rows × 8px
+    FontConfig(FONT_MEDIUM, 32, 8, 17, 0),  # Medium: 32 chars × 8 rows × 17px
+    FontConfig(FONT_LARGE, 25, 8, 17, 0),  # Large: 25 chars × 8 rows × 17px
 ]
 
 
+# Same configuration frozen into a tuple indexed by font id, hot paths index it
+# directly instead of going through get_font_config()
+FONT_CONFIG_TUPLE = tuple(FONT_CONFIGURATION)
+
+
 # Helper to get font config by ID
 def get_font_config(font_id):
     """Get font configuration tuple by font ID"""
-    if 0 <= font_id < len(FONT_CONFIGURATION):
-        return FONT_CONFIGURATION[font_id]
-    return FONT_CONFIGURATION[FONT_NORMAL]
+    if 0 <= font_id < len(FONT_CONFIG_TUPLE):
+        return FONT_CONFIG_TUPLE[font_id]
+    return FONT_CONFIG_TUPLE[FONT_NORMAL]
 
 
 # =============================================================================
@@ -136,6 +157,10 @@ SCREEN_HEIGHT_PIXELS = 136
 # The prompt prefix shown on the input line
 PROMPT = "CMD> "
 
+# Keys typed within this long of the last prompt redraw are folded into a single
+# redraw, a fast typist would otherwise queue one serial write per key
+PROMPT_REDRAW_INTERVAL = 16 / 1000  # 16ms
+
 # =============================================================================
 # TERMINAL BUFFER CONFIGURATION
 # =============================================================================
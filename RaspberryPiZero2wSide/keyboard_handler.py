@@ -2,10 +2,54 @@
 Keyboard handler for Smart Response XE Terminal
 
 Processes keyboard input from the Arduino and handles modifier key combinations.
+
+Every possible key byte is resolved up front into three 256 entry tables (no
+modifier, Shift, Sym), so handling a key is a single tuple lookup. The actions
+returned are shared read only mappings, nothing is allocated per keystroke.
 """
 
+import sys
+from types import MappingProxyType
+
 from config import KEY_MODIFIER_SHIFT, KEY_MODIFIER_SYM
 
+ENTER_ACTION = MappingProxyType({"action": "enter"})
+BACKSPACE_ACTION = MappingProxyType({"action": "backspace"})
+CLEAR_BUFFER_ACTION = MappingProxyType({"action": "clear_buffer"})
+FONT_CHANGE_ACTIONS = tuple(MappingProxyType({"action": "font_change", "font": font}) for font in range(4))
+
+
+def _build_key_tables():
+    """Build the (regular, shift, sym) lookup tables indexed by key code"""
+
+    # Printable characters are the default for every table
+    printable = [None] * 256
+    for key in range(32, 127):
+        printable[key] = sys.intern(chr(key))
+
+    regular = list(printable)
+    # DEL (0x08) = Enter
+    regular[0x08] = ENTER_ACTION
+    # Backspace (0x7F)
+    regular[0x7F] = BACKSPACE_ACTION
+
+    shift = list(printable)
+    # Shift + 0-3: Font switching
+    for font, action in enumerate(FONT_CHANGE_ACTIONS):
+        shift[0x30 + font] = action
+    # Shift + DEL (0x08): Backspace
+    shift[0x08] = BACKSPACE_ACTION
+
+    sym = list(printable)
+    # Sym + C: Clear screen, either case
+    sym[0x63] = CLEAR_BUFFER_ACTION
+    sym[0x43] = CLEAR_BUFFER_ACTION
+
+    return tuple(regular), tuple(shift), tuple(sym)
+
+
+_REGULAR_KEYS, _SHIFT_KEYS, _SYM_KEYS = _build_key_tables()
+
 
 class KeyboardHandler:
     """
@@ -16,6 +60,8 @@ class KeyboardHandler:
     returns appropriate actions.
     """
 
+    _tables = {None: _REGULAR_KEYS, 'shift': _SHIFT_KEYS, 'sym': _SYM_KEYS}
+
     def __init__(self):
         self.modifier_active = None
 
@@ -29,7 +75,7 @@ class KeyboardHandler:
         Returns:
             - None: Modifier key (ignore, wait for next key)
             - str: Regular character to add to command
-            - dict: Action to execute:
+            - Mapping: Action to execute (read only, shared between calls):
                 - {"action": "enter"}
                 - {"action": "backspace"}
                 - {"action": "font_change", "font": 0-3}
@@ -44,64 +90,7 @@ class KeyboardHandler:
             self.modifier_active = 'sym'
             return None
 
-        # Process with active modifier
-        if self.modifier_active == 'shift':
-            result = self._handle_shift_key(key)
-            self.modifier_active = None
-            return result
-
-        if self.modifier_active == 'sym':
-            result = self._handle_sym_key(key)
-            self.modifier_active = None
-            return result
-
-        # No modifier - regular key
-        return self._handle_regular_key(key)
-
-    def _handle_shift_key(self, key: int):
-        """Handle Shift + key combinations"""
-
-        # Shift + 0-3: Font switching
-        if key == 0x30:
-            return {"action": "font_change", "font": 0}
-        if key == 0x31:
-            return {"action": "font_change", "font": 1}
-        if key == 0x32:
-            return {"action": "font_change", "font": 2}
-        if key == 0x33:
-            return {"action": "font_change", "font": 3}
-
-        # Shift + DEL (0x08): Backspace
-        if key == 0x08:
-            return {"action": "backspace"}
-
-        # Default: treat as regular character
-        return chr(key) if 32 <= key <= 126 else None
-
-    def _handle_sym_key(self, key: int):
-        """Handle Sym + key combinations"""
-
-        # Sym + C: Clear screen
-        if key == 0x63:
-            return {"action": "clear_buffer"}
-
-        # Default: treat as regular character
-        return chr(key) if 32 <= key <= 126 else None
-
-    def _handle_regular_key(self, key: int):
-        """Handle regular key presses"""
-
-        # DEL (0x08) = Enter
-        if key == 0x08:
-            return {"action": "enter"}
-
-        # Backspace (0x7F)
-        if key == 0x7F:
-            return {"action": "backspace"}
-
-        # Printable character
-        if 32 <= key <= 126:
-            return chr(key)
-
-        # Ignore other special keys
-        return None
+        # A modifier only applies to the key right after it
+        table = self._tables[self.modifier_active]
+        self.modifier_active = None
+        return table[key]
@@ -98,7 +98,7 @@ from keyboard_handler import KeyboardHandler
 from PyteAndPtyProcessTerminal import PyteAndPtyProcessTerminal
 from SubprocessTerminal import SubprocessTerminal
 
-from serialCommunicationsToArduino import SerialCommunicationToArduino, PROMPT
+from serialCommunicationsToArduino import SerialCommunicationToArduino
 from utilities import Utilities
 import time
 
@@ -140,8 +140,6 @@ def main():
 
     try:
         while True:
-            Utilities.delay_to_not_bog_cpu()
-
             current_font = terminal.get_current_font()
             serial_to_duino.update_prompt("", current_font)
 
@@ -158,8 +156,8 @@ def main():
                     current_font = result["font"]
                     Utilities.print_with_indent(f"switching font to font size: {current_font}")
                     terminal.switch_font(current_font)
-                    serial_to_duino.clear_screen(clear_buffer=False)
-                    serial_to_duino.re_send_screen_lines_to_arduino(current_font)
+                    # clear and redraw go out together, one handshake instead of two
+                    serial_to_duino.re_send_screen_lines_to_arduino(current_font, clear_first=True)
                     # this is the default, in this case, we are switching fonts and we want to redraw anything,
                     # as there is nothing "old" that can help us as the font is different
                     # this is equivalent to say
@@ -193,19 +191,16 @@ def main():
                     else:
                         Utilities.print_with_indent(f"Executing: {cmd}")
 
-                        terminal.run_command("echo '========================='", timeout=10.0)
-                        terminal.run_command(f"echo '{PROMPT}" + cmd + "   '", timeout=10.0)
-
-                        # I need to force the IF to force the command to be executed by the time
-                        # I grab the screen
-                        if terminal.run_command(cmd, timeout=10.0):
-                            serial_to_duino.send_new_screen_lines_to_arduino(
-                                terminal.get_screen_new_lines(),
-                                current_font)
-                        else:
-                            serial_to_duino.send_new_screen_lines_to_arduino(
-                                terminal.get_screen_new_lines(),
-                                current_font)
+                        # separator and command line are written straight to the terminal,
+                        # no shell is started just to echo them
+                        terminal.write_marker(cmd)
+
+                        # run_command only returns once the command finished (or timed out),
+                        # so the screen is complete by the time it's grabbed, either way
+                        terminal.run_command(cmd, timeout=10.0)
+                        serial_to_duino.send_new_screen_lines_to_arduino(
+                            terminal.get_screen_new_lines(),
+                            current_font)
 
                 Utilities.print_with_indent(f"Operation completed in {time.time() - start_time} secs")
 
@@ -0,0 +1,20 @@
+# cython: language_level=3
+#
+# Types for protocol.py when it is compiled with Cython, see docs/INSTALLATION.md.
+# Without Cython this file is ignored and protocol.py runs as plain Python.
+
+cimport cython
+
+
+cdef class PacketParser:
+    cdef public object state
+    cdef public bytearray buffer
+    cdef public Py_ssize_t _buflen
+    cdef public int expected_length
+    cdef public int key_byte
+    cdef public int checksum_byte
+
+    cpdef _append(self, chunk)
+
+    @cython.locals(pos=Py_ssize_t, size=Py_ssize_t, need=Py_ssize_t, end=Py_ssize_t)
+    cpdef list feed_bytes(self, data)
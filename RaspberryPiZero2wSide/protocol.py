@@ -30,8 +30,11 @@ PACKET TYPES:
    [0xFF]
    No-op byte, ignored.
 """
+from enum import IntEnum
+
 import utilities
 from config import (
+    LOG_LEVEL_TO_SEE,
     CMD_READY_FOR_NEXT_COMMAND,
     CMD_PADDING_MARKER,
     KEY_START_MARKER,
@@ -43,6 +46,37 @@ from config import (
 )
 
 
+def xor_all(data) -> int:
+    """
+    XOR of all the bytes in data.
+
+    Reads the whole buffer as one big int and keeps folding the high half onto
+    the low half, so the work happens in C in ~log2(len) steps instead of one
+    interpreted loop iteration per byte.
+    """
+    value = int.from_bytes(data, 'little')
+    size = len(data)
+    while size > 1:
+        half = (size + 1) // 2
+        shift = half * 8
+        value = (value & ((1 << shift) - 1)) ^ (value >> shift)
+        size = half
+    return value
+
+
+class ParserState(IntEnum):
+    """Parser states, small ints so comparing them is cheap"""
+    IDLE = 0
+    KEY_WAIT_DATA = 1
+    KEY_WAIT_CHECKSUM = 2
+    KEY_WAIT_END = 3
+    LINE_WAIT_LENGTH = 4
+    LINE_WAIT_DATA = 5
+    LINE_WAIT_CHECKSUM = 6
+    LINE_WAIT_END = 7
+    DEBUG_WAIT_DATA = 8
+
+
 class PacketParser:
     """
     Non-blocking state machine parser for Arduino packets.
@@ -55,22 +89,31 @@ class PacketParser:
             packet = parser.feed(byte)
             if packet:
                 handle_packet(packet)
+
+        or, with a whole chunk of bytes at once:
+
+        for packet in parser.feed_bytes(serial.read(serial.in_waiting)):
+            handle_packet(packet)
     """
 
     # Parser states
-    STATE_IDLE = 'IDLE'
-    STATE_KEY_WAIT_DATA = 'KEY_WAIT_DATA'
-    STATE_KEY_WAIT_CHECKSUM = 'KEY_WAIT_CHECKSUM'
-    STATE_KEY_WAIT_END = 'KEY_WAIT_END'
-    STATE_LINE_WAIT_LENGTH = 'LINE_WAIT_LENGTH'
-    STATE_LINE_WAIT_DATA = 'LINE_WAIT_DATA'
-    STATE_LINE_WAIT_CHECKSUM = 'LINE_WAIT_CHECKSUM'
-    STATE_LINE_WAIT_END = 'LINE_WAIT_END'
-    STATE_DEBUG_WAIT_DATA = 'DEBUG_WAIT_DATA'
+    STATE_IDLE = ParserState.IDLE
+    STATE_KEY_WAIT_DATA = ParserState.KEY_WAIT_DATA
+    STATE_KEY_WAIT_CHECKSUM = ParserState.KEY_WAIT_CHECKSUM
+    STATE_KEY_WAIT_END = ParserState.KEY_WAIT_END
+    STATE_LINE_WAIT_LENGTH = ParserState.LINE_WAIT_LENGTH
+    STATE_LINE_WAIT_DATA = ParserState.LINE_WAIT_DATA
+    STATE_LINE_WAIT_CHECKSUM = ParserState.LINE_WAIT_CHECKSUM
+    STATE_LINE_WAIT_END = ParserState.LINE_WAIT_END
+    STATE_DEBUG_WAIT_DATA = ParserState.DEBUG_WAIT_DATA
 
     def __init__(self):
         self.state = self.STATE_IDLE
-        self.buffer = bytearray()
+        # Payload storage, allocated once for the longest LINE packet (length is
+        # one byte) and only grown by long DEBUG messages. _buflen is how much of
+        # it holds the current payload, resetting doesn't give the memory back.
+        self.buffer = bytearray(256)
+        self._buflen = 0
         self.expected_length = 0
         self.key_byte = 0
         self.checksum_byte = 0
@@ -78,11 +121,31 @@ class PacketParser:
     def reset(self):
         """Reset parser to idle state"""
         self.state = self.STATE_IDLE
-        self.buffer.clear()
+        self._buflen = 0
         self.expected_length = 0
         self.key_byte = 0
         self.checksum_byte = 0
 
+    def _append(self, chunk):
+        """Copy a chunk of payload into the buffer, doubling it if it doesn't fit"""
+        end = self._buflen + len(chunk)
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(max(end, 2 * len(self.buffer)) - len(self.buffer)))
+        self.buffer[self._buflen:end] = chunk
+        self._buflen = end
+
+    def _take_debug_message(self):
+        """Return the buffered payload as a debug packet and empty the buffer"""
+        # decoded straight out of the buffer, the view is released before the
+        # buffer can be grown again
+        with memoryview(self.buffer) as view:
+            payload = view[:self._buflen]
+            self._buflen = 0
+            try:
+                return {'type': 'debug', 'message': str(payload, 'utf-8')}
+            except UnicodeDecodeError:
+                return {'type': 'debug', 'message': f'[decode error] {payload.hex()}'}
+
     def feed(self, byte):
         """
         Feed a single byte to the parser.
@@ -101,7 +164,10 @@ class PacketParser:
             - {'type': 'error', 'reason': str}
         """
 
-        utilities.Utilities.print_with_indent_and_log_level(f"Received 0x{byte:02x} while state is {self.state}", 1)
+        # checked here so the message isn't even formatted at normal log levels
+        if LOG_LEVEL_TO_SEE <= 1:
+            utilities.Utilities.print_with_indent_and_log_level(
+                f"Received 0x{byte:02x} while state is {self.state.name}", 1)
 
         # IDLE state - waiting for start of packet
         if self.state == self.STATE_IDLE:
@@ -132,7 +198,7 @@ class PacketParser:
         # LINE packet states
         elif self.state == self.STATE_LINE_WAIT_LENGTH:
             self.expected_length = byte
-            self.buffer.clear()
+            self._buflen = 0
             if self.expected_length == 0:
                 self.state = self.STATE_LINE_WAIT_CHECKSUM
             else:
@@ -140,8 +206,10 @@ class PacketParser:
             return None
 
         elif self.state == self.STATE_LINE_WAIT_DATA:
-            self.buffer.append(byte)
-            if len(self.buffer) >= self.expected_length:
+            # never past 255 bytes, the buffer always has room
+            self.buffer[self._buflen] = byte
+            self._buflen += 1
+            if self._buflen >= self.expected_length:
                 self.state = self.STATE_LINE_WAIT_CHECKSUM
             return None
 
@@ -153,19 +221,19 @@ class PacketParser:
         elif self.state == self.STATE_LINE_WAIT_END:
             self.state = self.STATE_IDLE
             if byte == LINE_END_MARKER:
-                # Calculate expected checksum
-                expected_checksum = LINE_START_MARKER ^ self.expected_length
-                for b in self.buffer:
-                    expected_checksum ^= b
-
-                if self.checksum_byte == expected_checksum:
-                    try:
-                        data = self.buffer.decode('ascii')
-                        return {'type': 'line', 'data': data}
-                    except UnicodeDecodeError:
-                        return {'type': 'error', 'reason': 'line_decode_fail'}
-                else:
-                    return {'type': 'error', 'reason': 'line_checksum_fail'}
+                # Checksum and decode straight out of the buffer, no bytearray copy
+                with memoryview(self.buffer) as view:
+                    payload = view[:self._buflen]
+                    expected_checksum = LINE_START_MARKER ^ self.expected_length ^ xor_all(payload)
+
+                    if self.checksum_byte == expected_checksum:
+                        try:
+                            data = str(payload, 'ascii')
+                            return {'type': 'line', 'data': data}
+                        except UnicodeDecodeError:
+                            return {'type': 'error', 'reason': 'line_decode_fail'}
+                    else:
+                        return {'type': 'error', 'reason': 'line_checksum_fail'}
             else:
                 return {'type': 'error', 'reason': 'line_end_marker_missing'}
 
@@ -173,16 +241,12 @@ class PacketParser:
         elif self.state == self.STATE_DEBUG_WAIT_DATA:
             if byte == DEBUG_END_MARKER:
                 self.state = self.STATE_IDLE
-                try:
-                    message = self.buffer.decode('utf-8')
-                    self.buffer.clear()
-                    return {'type': 'debug', 'message': message}
-                except UnicodeDecodeError:
-                    response = self.buffer.hex()
-                    self.buffer.clear()
-                    return {'type': 'debug', 'message': f'[decode error] {response}'}
+                return self._take_debug_message()
             else:
-                self.buffer.append(byte)
+                if self._buflen == len(self.buffer):
+                    self.buffer.extend(bytes(len(self.buffer)))
+                self.buffer[self._buflen] = byte
+                self._buflen += 1
                 return None
 
         # Unknown state - reset
@@ -190,6 +254,50 @@ class PacketParser:
             self.reset()
             return {'type': 'error', 'reason': 'unknown_state'}
 
+    def feed_bytes(self, data) -> list:
+        """
+        Feed a chunk of bytes to the parser.
+
+        Same result as calling feed() for every byte, but the payload of LINE and
+        DEBUG packets is copied with slices instead of going through the state
+        machine byte by byte.
+
+        Args:
+            data: bytes or bytearray
+
+        Returns:
+            List of packet dicts (see feed()) completed by this chunk, in order.
+        """
+        packets = []
+        pos = 0
+        size = len(data)
+
+        while pos < size:
+            if self.state == self.STATE_LINE_WAIT_DATA:
+                need = self.expected_length - self._buflen
+                self._append(data[pos:pos + need])
+                pos += need
+                if self._buflen >= self.expected_length:
+                    self.state = self.STATE_LINE_WAIT_CHECKSUM
+                continue
+
+            if self.state == self.STATE_DEBUG_WAIT_DATA:
+                end = data.find(DEBUG_END_MARKER, pos)
+                if end < 0:
+                    # message continues in the next chunk
+                    self._append(data[pos:])
+                    break
+                self._append(data[pos:end])
+                # the end marker itself goes through feed() below
+                pos = end
+
+            packet = self.feed(data[pos])
+            pos += 1
+            if packet:
+                packets.append(packet)
+
+        return packets
+
     def _handle_idle(self, byte):
         """Handle byte in IDLE state"""
 
@@ -206,17 +314,9 @@ class PacketParser:
 
         elif byte == DEBUG_START_MARKER:
             self.state = self.STATE_DEBUG_WAIT_DATA
-            if len(self.buffer) > 0:
-                try:
-                    message = self.buffer.decode('utf-8')
-                    self.buffer.clear()
-                    return {'type': 'debug', 'message': message}
-                except UnicodeDecodeError:
-                    response = self.buffer.hex()
-                    self.buffer.clear()
-                    return {'type': 'debug', 'message': f'[decode error] {response}'}
-
-            self.buffer.clear()
+            if self._buflen > 0:
+                return self._take_debug_message()
+
             return None
 
         elif byte == CMD_PADDING_MARKER:
@@ -0,0 +1,29 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled version of the pyte screen render loop
+
+Same thing as render_lines in PyteAndPtyProcessTerminal.py, that one is used
+when this module isn't built. To build it on the pi:
+
+    sudo apt install cython3
+    cythonize -i render_screen.pyx
+"""
+
+
+def render_lines(buffer, int rows, int columns):
+    """Return the non empty rows of a pyte screen buffer, right stripped"""
+    cdef int row, col, width
+    cdef list lines = []
+    cdef str stripped
+
+    for row in range(rows):
+        # unwritten rows aren't stored, get() doesn't add them to the defaultdict
+        line = buffer.get(row)
+        if not line:
+            continue
+        width = min(max(line) + 1, columns)
+        stripped = "".join([line[col].data for col in range(width)]).rstrip()
+        if stripped:
+            lines.append(stripped)
+
+    return lines
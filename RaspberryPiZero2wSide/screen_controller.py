@@ -5,10 +5,16 @@ This module manages the screen buffer and sends display commands to the Arduino.
 It tracks what's currently displayed to optimize updates (only sending changed lines).
 """
 
+import functools
 import struct
+from collections import deque
+from itertools import islice, zip_longest
+from types import SimpleNamespace
 
 from config import (
+    ARDUINO_RX_BUFFER_SIZE,
     FONT_CONFIGURATION,
+    LOG_LEVEL_TO_SEE,
     CMD_WRITE_TEXT,
     CMD_SCROLL_UP,
     CMD_CLEAR_SCREEN,
@@ -20,6 +26,72 @@ from serial_connection import ArduinoSerial
 from utilities import Utilities
 
 
+@functools.lru_cache(maxsize=len(FONT_CONFIGURATION))
+def _font_tables(font_id: int) -> SimpleNamespace:
+    """
+    Everything the send paths need about a font, computed once per font.
+
+    - cols: characters per line
+    - visible_rows / rows_in_screen: rows on screen, without the prompt line
+    - pixels_per_row / padding: raw font metrics
+    - y: Y position of every visible row (y = row * pixels_per_row + padding)
+    - prompt_y: Y position of the prompt, the last visible row
+    """
+    font_config = FONT_CONFIGURATION[font_id]
+    cols = font_config.cols
+    visible_rows = font_config.rows_visible
+    pixels_per_row = font_config.pixels_per_row
+    padding = font_config.padding
+    return SimpleNamespace(
+        cols=cols,
+        visible_rows=visible_rows,
+        rows_in_screen=visible_rows - 1,  # -1 for prompt line
+        pixels_per_row=pixels_per_row,
+        padding=padding,
+        y=tuple(row * pixels_per_row + padding for row in range(visible_rows)),
+        prompt_y=visible_rows * pixels_per_row + padding - pixels_per_row,
+    )
+
+
+# Text command header: [CMD] [Y] [FONT] [FG] [BG] [LENGTH], compiled once
+_HEADER = struct.Struct('>BBBBBB')
+
+# latin-1 byte -> byte sent to the Arduino, anything that isn't ASCII becomes '?'
+_ASCII_REPLACE = bytes(range(128)) + b'?' * 128
+
+
+def _encode_text(line: str) -> bytes:
+    """
+    Encode a line for the Arduino, same result as encode('ascii', errors='replace').
+
+    latin-1 turns every character into one byte in C (characters past 0xFF are
+    already replaced there) and the table maps the non ASCII half to '?'.
+    """
+    return line.encode('latin-1', errors='replace').translate(_ASCII_REPLACE)
+
+
+def _encode_line(command: int, y_position: int, font_id: int, text_bytes: bytes) -> bytes:
+    """
+    Build a text command: [CMD] [Y] [FONT] [FG] [BG] [LENGTH] [TEXT...]
+
+    Always white (3) on black (0).
+    """
+    return _HEADER.pack(command, y_position, font_id, 3, 0, len(text_bytes)) + text_bytes
+
+
+def _same_line(new_line: str, old_line: str) -> bool:
+    """
+    Check if two lines would look the same on screen (ignoring surrounding spaces).
+
+    str caches its own hash, the old lines were hashed on a previous refresh so
+    comparing hashes first is mostly an int compare, the strings are only compared
+    (and stripped) when that isn't enough to decide.
+    """
+    if hash(new_line) == hash(old_line) and new_line == old_line:
+        return True
+    return new_line.strip() == old_line.strip()
+
+
 class ScreenController:
     """
     Manages screen content and sends display commands to Arduino.
@@ -28,6 +100,10 @@ class ScreenController:
     - Only sends lines that have changed
     - Handles scrolling efficiently
     - Manages the command prompt separately from output
+
+    Between begin_batch() and end_batch() commands are queued and sent together,
+    as many as fit in the Arduino receive buffer per write, instead of doing a
+    send + wait for ready round trip for every single one.
     """
 
     def __init__(self, serial: ArduinoSerial):
@@ -38,17 +114,89 @@ class ScreenController:
             serial: ArduinoSerial instance for communication
         """
         self._serial = serial
-        self._lines: list[str] = []  # Buffer of lines sent to screen
+        # Buffer of lines sent to screen, a ring buffer so old history falls off
+        # the front on its own instead of re-slicing the whole list every update
+        self._lines: deque[str] = deque(maxlen=TERMINAL_HISTORY_ROWS)
+        # Commands waiting to be sent while batching and their total size, None
+        # when not batching
+        self._pending: list[bytes] | None = None
+        self._pending_size = 0
+        # Last write text packet sent to each (font_id, y) position, so an output
+        # row that would be redrawn with exactly the same bytes isn't sent again
+        self._row_packets: dict[tuple[int, int], bytes] = {}
 
     @property
-    def lines(self) -> list[str]:
-        """Get current line buffer (for testing)"""
+    def lines(self) -> deque[str]:
+        """Get the live line buffer, not a copy, callers must not modify it"""
         return self._lines
 
     @lines.setter
     def lines(self, value: list[str]):
         """Set line buffer (for testing)"""
-        self._lines = value
+        self._lines = deque(value, maxlen=TERMINAL_HISTORY_ROWS)
+
+    def lines_snapshot(self) -> list[str]:
+        """Get a copy of the line buffer that is safe to keep or modify"""
+        return list(self._lines)
+
+    def begin_batch(self):
+        """Start queueing commands instead of sending them one at a time"""
+        self._pending = []
+        self._pending_size = 0
+
+    def end_batch(self):
+        """Send everything queued since begin_batch() and stop batching"""
+        self._flush_pending()
+        self._pending = None
+
+    def _flush_pending(self):
+        """
+        Send the queued commands in one write and wait for all their ready signals.
+
+        On a bad command byte the Arduino empties its whole receive buffer, so
+        everything queued after it is lost and its ready signals never come. The
+        first missing ready ends the wait, the commands from there on are sent
+        again one at a time, where a bad byte only costs that one command.
+        """
+        if not self._pending:
+            return
+
+        commands = self._pending
+        self._pending = []
+        self._pending_size = 0
+
+        self._serial.send(b"".join(commands))
+        # the Arduino still answers every command with its own ready signal, in order
+        for answered in range(len(commands)):
+            if not self._serial.wait_for_ready(timeout=1.0):
+                break
+        else:
+            return
+
+        Utilities.print_with_indent(
+            f"Missing ready after {answered} of {len(commands)} batched commands, resending the rest")
+
+        for cmd in commands[answered:]:
+            self._serial.send(cmd)
+            if not self._serial.wait_for_ready(timeout=1.0):
+                # the Arduino isn't answering at all, don't stall a second per
+                # command, and don't trust what the rows show for the next update
+                self._row_packets.clear()
+                return
+
+    def _send_command(self, cmd: bytes):
+        """Send a command and wait for the Arduino, or queue it while batching"""
+        if self._pending is None:
+            self._serial.send(cmd)
+            self._serial.wait_for_ready(timeout=1.0)
+            return
+
+        # anything past the Arduino receive buffer would be dropped
+        if self._pending_size + len(cmd) > ARDUINO_RX_BUFFER_SIZE:
+            self._flush_pending()
+
+        self._pending.append(cmd)
+        self._pending_size += len(cmd)
 
     def clear_screen(self, clear_buffer: bool = True):
         """
@@ -60,9 +208,10 @@ class ScreenController:
         if clear_buffer:
             self._lines.clear()
 
-        cmd = struct.pack('>B', CMD_CLEAR_SCREEN)
-        self._serial.send(cmd)
-        self._serial.wait_for_ready(timeout=1.0)
+        # also the only way the font changes on screen
+        self._row_packets.clear()
+
+        self._send_command(bytes((CMD_CLEAR_SCREEN,)))
 
     def scroll_screen_up(self, pixels: int):
         """
@@ -71,13 +220,14 @@ class ScreenController:
         Args:
             pixels: Number of pixels to scroll
         """
-        Utilities.print_with_indent(f"Scrolling up: {pixels} pixels")
+        # part of every screen update, debug only like the per row messages
+        if LOG_LEVEL_TO_SEE <= 2:
+            Utilities.print_with_indent_and_log_level(f"Scrolling up: {pixels} pixels", 2)
 
-        cmd = struct.pack('>B', CMD_SCROLL_UP)
-        cmd += struct.pack('>B', pixels)
+        # everything on screen moved, what was sent to each row no longer applies
+        self._row_packets.clear()
 
-        self._serial.send(cmd)
-        self._serial.wait_for_ready(timeout=1.0)
+        self._send_command(bytes((CMD_SCROLL_UP, pixels)))
 
     def update_prompt(self, text: str, font_id: int):
         """
@@ -89,13 +239,8 @@ class ScreenController:
             text: Text to display after "CMD> "
             font_id: Current font ID
         """
-        font_config = FONT_CONFIGURATION[font_id]
-
-        # Calculate Y position for last line
-        # y = rows_visible * pixels_per_row + padding - pixels_per_row
-        y = font_config[2] * font_config[3] + font_config[4] - font_config[3]
-
-        self._send_line_raw(y, font_id, text, CMD_PRINT_PROMPT)
+        # Y position for last line (rows_visible * pixels_per_row + padding - pixels_per_row)
+        self._send_line_raw(_font_tables(font_id).prompt_y, font_id, text, CMD_PRINT_PROMPT)
 
     def send_line(self, line: str, display_row: int, font_id: int, force_pad: bool = True):
         """
@@ -105,7 +250,7 @@ class ScreenController:
             line: Text to display
             display_row: Row number on display (0 = top)
             font_id: Current font ID
-            force_pad: If True, pad line to full width
+            force_pad: If True, cut the line to the font width
         """
         if display_row < 0:
             Utilities.print_with_indent(f"invalid display_row: {display_row}")
@@ -119,17 +264,22 @@ class ScreenController:
         if len(line) == 24:
             line = line + "_"
 
-        font_config = FONT_CONFIGURATION[font_id]
-        font_cols = font_config[1]
+        tables = _font_tables(font_id)
 
-        # Pad or truncate line to font width
+        # Truncate line to font width. Padding it with spaces isn't needed, the
+        # trailing blanks are stripped in _send_line_raw before encoding anyway
         if force_pad:
-            line = line[:font_cols].ljust(font_cols)
+            line = line[:tables.cols]
 
-        # Calculate Y position
-        y = display_row * font_config[3] + font_config[4]
+        # Y position, rows past the bottom of the screen aren't in the table
+        if display_row < tables.visible_rows:
+            y = tables.y[display_row]
+        else:
+            y = display_row * tables.pixels_per_row + tables.padding
 
-        Utilities.print_with_indent_and_log_level(f"display_row: {display_row}, Y: {y}", 1)
+        # checked here so the message isn't even formatted at normal log levels
+        if LOG_LEVEL_TO_SEE <= 1:
+            Utilities.print_with_indent_and_log_level(f"display_row: {display_row}, Y: {y}", 1)
         self._send_line_raw(y, font_id, line, CMD_WRITE_TEXT)
 
     def _send_line_raw(self, y_position: int, font_id: int, line: str,
@@ -143,26 +293,25 @@ class ScreenController:
             line: Text to display
             command: Command byte (CMD_WRITE_TEXT or CMD_PRINT_PROMPT)
         """
-        text_bytes = line.rstrip().encode('ascii', errors='replace')
-        length = len(text_bytes)
+        text_bytes = _encode_text(line.rstrip())
 
-        fore_color = 3  # White
-        back_color = 0  # Black
+        cmd = _encode_line(command, y_position, font_id, text_bytes)
 
-        cmd = struct.pack('>B', command)
-        cmd += struct.pack('>B', y_position)
-        cmd += struct.pack('>B', font_id)
-        cmd += struct.pack('>B', fore_color)
-        cmd += struct.pack('>B', back_color)
-        cmd += struct.pack('>B', length)
-        cmd += text_bytes
+        # The row already shows exactly this. Only for output rows, the Arduino
+        # clears its typed input when it gets a prompt packet and redraws the
+        # prompt row on its own, so the prompt always has to go out
+        if command == CMD_WRITE_TEXT:
+            key = (font_id, y_position)
+            if self._row_packets.get(key) == cmd:
+                return
+            self._row_packets[key] = cmd
 
-        Utilities.print_with_indent(
-            f"command: 0x{command:02X}, y: {y_position}, font: {font_id}, "
-            f"len: {length}, text: {line[:20]}...")
+        if LOG_LEVEL_TO_SEE <= 2:
+            Utilities.print_with_indent_and_log_level(
+                f"command: 0x{command:02X}, y: {y_position}, font: {font_id}, "
+                f"len: {len(text_bytes)}, text: {line[:20]}...", 2)
 
-        self._serial.send(cmd)
-        self._serial.wait_for_ready(timeout=1.0)
+        self._send_command(cmd)
 
     def send_new_lines(self, lines_to_print: list[str], font_id: int,
                        force_redraw: bool = False):
@@ -185,58 +334,61 @@ class ScreenController:
         if scrolled_lines == 0:
             return
 
-        font_config = FONT_CONFIGURATION[font_id]
-        visible_rows = font_config[2]
-        rows_in_screen = visible_rows - 1  # -1 for prompt line
+        tables = _font_tables(font_id)
+        visible_rows = tables.visible_rows
+        rows_in_screen = tables.rows_in_screen
 
-        Utilities.print_lines(self._lines, lines_to_print,
-                              f"old_lines vs lines_to_print; visible_rows: {visible_rows}, "
-                              f"rows_in_screen: {rows_in_screen}")
+        # whole history dumps, debug only and not even formatted otherwise
+        if LOG_LEVEL_TO_SEE <= 2:
+            Utilities.print_lines(self._lines, lines_to_print,
+                                  f"old_lines vs lines_to_print; visible_rows: {visible_rows}, "
+                                  f"rows_in_screen: {rows_in_screen}")
 
         Utilities.trim_trailing_empty(lines_to_print)
         Utilities.trim_trailing_empty(self._lines)
 
-        if not force_redraw:
-            scrolled_lines = len(lines_to_print)
-
-            # Case 1: Fewer new lines than screen rows - scroll and add
-            if rows_in_screen > scrolled_lines:
-                scroll_pixels = scrolled_lines * font_config[3]
-                self.scroll_screen_up(scroll_pixels)
-
-                # Print new lines from bottom up
-                for i in range(0, scrolled_lines):
-                    new_line = lines_to_print[len(lines_to_print) - i - 1]
-
-                    # Skip prompt lines
-                    if not new_line.startswith(PROMPT):
-                        self.send_line(new_line, rows_in_screen - i - 1, font_id)
-
-            # Case 2: More or equal new lines - compare and update only differences
-            else:
-                for i in range(0, rows_in_screen):
-                    new_line = lines_to_print[len(lines_to_print) - 1 - i]
-
-                    # Get old line if it exists
-                    old_line = ""
-                    old_line_position = len(self._lines) - 1 - i
-                    if (len(self._lines) > old_line_position >= 0 and
-                            len(self._lines) > 0):
-                        old_line = self._lines[old_line_position]
-
-                    # Skip prompt lines
-                    if not new_line.startswith(PROMPT):
-                        # Only send if different
-                        if new_line.strip() != old_line.strip():
-                            self.send_line(new_line, rows_in_screen - i - 1, font_id)
-
-        # Update local buffer
+        # Scroll and lines go out together, flushed once per receive buffer
+        self.begin_batch()
+        try:
+            if not force_redraw:
+                scrolled_lines = len(lines_to_print)
+
+                # Case 1: Fewer new lines than screen rows - scroll and add
+                if rows_in_screen > scrolled_lines:
+                    scroll_pixels = scrolled_lines * tables.pixels_per_row
+                    self.scroll_screen_up(scroll_pixels)
+
+                    # Print new lines from bottom up
+                    for row, new_line in zip(range(rows_in_screen - 1, -1, -1),
+                                             reversed(lines_to_print)):
+
+                        # Skip prompt lines
+                        if not new_line.startswith(PROMPT):
+                            self.send_line(new_line, row, font_id)
+
+                # Case 2: More or equal new lines - compare and update only differences
+                else:
+                    # Walk new and old lines from the bottom row up together, rows
+                    # with no old line compare against ""
+                    new_lines = islice(reversed(lines_to_print), rows_in_screen)
+                    old_lines = islice(reversed(self._lines), rows_in_screen)
+                    for row, (new_line, old_line) in zip(
+                            range(rows_in_screen - 1, -1, -1),
+                            zip_longest(new_lines, old_lines, fillvalue="")):
+
+                        # Skip prompt lines, only send if different
+                        if not new_line.startswith(PROMPT) and not _same_line(new_line, old_line):
+                            self.send_line(new_line, row, font_id)
+        finally:
+            self.end_batch()
+
+        # Update local buffer, the deque drops whatever goes past TERMINAL_HISTORY_ROWS
         self._lines.extend(lines_to_print)
-        self._lines = self._lines[-TERMINAL_HISTORY_ROWS:]
 
-        Utilities.print_lines(self._lines, lines_to_print, "rows after printing")
+        if LOG_LEVEL_TO_SEE <= 2:
+            Utilities.print_lines(self._lines, lines_to_print, "rows after printing")
 
-    def resend_screen(self, font_id: int):
+    def resend_screen(self, font_id: int, clear_first: bool = False):
         """
         Resend all visible lines to the screen.
 
@@ -244,20 +396,21 @@ class ScreenController:
 
         Args:
             font_id: Current font ID
+            clear_first: If True, clear the screen (keeping the line buffer) in
+                the same batch as the lines
         """
         Utilities.print_with_indent("Resending screen")
 
-        font_config = FONT_CONFIGURATION[font_id]
-        visible_rows = font_config[2]
-        rows_in_screen = visible_rows - 1
+        rows_in_screen = _font_tables(font_id).rows_in_screen
 
-        # Send lines from bottom up
-        line_index = 1
-        for row in range(rows_in_screen, 0, -1):
-            if len(self._lines) > 0:
-                buffer_index = len(self._lines) - line_index
-                if buffer_index >= 0:
-                    line = self._lines[buffer_index]
-                    self.send_line(line, row - 1, font_id)
+        # Send lines from bottom up, walking the buffer backwards (indexing the
+        # middle of a deque isn't cheap)
+        self.begin_batch()
+        try:
+            if clear_first:
+                self.clear_screen(clear_buffer=False)
 
-            line_index += 1
+            for row, line in zip(range(rows_in_screen - 1, -1, -1), reversed(self._lines)):
+                self.send_line(line, row, font_id)
+        finally:
+            self.end_batch()
@@ -7,10 +7,15 @@ into a single interface that matches the original API for backward compatibility
 """
 
 import time
+from collections import deque
+from collections.abc import Mapping
 
 from config import (
+    CMD_WRITE_TEXT,
     FONT_CONFIGURATION,
+    LOG_LEVEL_TO_SEE,
     PROMPT,
+    PROMPT_REDRAW_INTERVAL,
     LINE_START_MARKER,
     TERMINAL_HISTORY_ROWS,
 )
@@ -48,8 +53,8 @@ class SerialCommunicationToArduino:
         self._screen = ScreenController(self._arduino)
 
     @property
-    def lines(self) -> list[str]:
-        """Get current line buffer"""
+    def lines(self) -> deque[str]:
+        """Get the live line buffer, not a copy, callers must not modify it"""
         return self._screen.lines
 
     @lines.setter
@@ -57,11 +62,19 @@ class SerialCommunicationToArduino:
         """Set line buffer (for testing)"""
         self._screen.lines = value
 
+    def lines_snapshot(self) -> list[str]:
+        """Get a copy of the line buffer"""
+        return self._screen.lines_snapshot()
+
     @property
     def ser(self):
         """Get underlying serial object (for backward compatibility)"""
         return self._arduino._ser
 
+    def fileno(self) -> int:
+        """File descriptor of the serial port, for select/poll"""
+        return self._arduino.fileno()
+
     def clear_screen(self, clear_buffer: bool = True):
         """Clear the screen"""
         start_time = time.time()
@@ -76,6 +89,11 @@ class SerialCommunicationToArduino:
 
     def update_prompt(self, prompt: str, font_id: int):
         """Update the command prompt"""
+        # runs on every key press, skip building the messages when info is filtered
+        if LOG_LEVEL_TO_SEE > 3:
+            self._screen.update_prompt(prompt, font_id)
+            return
+
         start_time = time.time()
         Utilities.print_with_indent(f"prompt: {prompt}")
         self._screen.update_prompt(prompt, font_id)
@@ -87,11 +105,8 @@ class SerialCommunicationToArduino:
         self._screen.send_line(line, display_row, font_id, force_pad)
 
     def send_line_to_arduino2(self, y_position: int, font_id: int, line: str,
-                              command_to_send: int = None):
+                              command_to_send: int = CMD_WRITE_TEXT):
         """Send a line at a specific Y position"""
-        from config import CMD_WRITE_TEXT
-        if command_to_send is None:
-            command_to_send = CMD_WRITE_TEXT
         self._screen._send_line_raw(y_position, font_id, line, command_to_send)
 
     def send_new_screen_lines_to_arduino(self, lines_to_print: list[str],
@@ -99,9 +114,9 @@ class SerialCommunicationToArduino:
         """Send new lines to screen with optimization"""
         self._screen.send_new_lines(lines_to_print, font_id, force_redraw)
 
-    def re_send_screen_lines_to_arduino(self, font_id: int):
-        """Resend all visible lines"""
-        self._screen.resend_screen(font_id)
+    def re_send_screen_lines_to_arduino(self, font_id: int, clear_first: bool = False):
+        """Resend all visible lines, optionally clearing the screen in the same write"""
+        self._screen.resend_screen(font_id, clear_first)
 
     def send_using_serial_to_duino(self, cmd: bytes):
         """Send raw bytes to Arduino"""
@@ -125,19 +140,35 @@ class SerialCommunicationToArduino:
             - {"action": str, ...}
         """
         command = ""
+        # Prompt text typed but not drawn yet, and when it was last drawn
+        pending_prompt = None
+        last_prompt_redraw = 0.0
 
         while True:
-            Utilities.delay_to_not_bog_cpu()
+            if pending_prompt is not None:
+                # Draw now unless the last redraw was very recent, then give more
+                # keys until the interval ends to arrive and join this redraw
+                wait = PROMPT_REDRAW_INTERVAL - (time.monotonic() - last_prompt_redraw)
+                if wait <= 0 or not self._arduino.wait_for_data(wait):
+                    self.update_prompt(pending_prompt, font_id)
+                    pending_prompt = None
+                    last_prompt_redraw = time.monotonic()
+                    continue
+            else:
+                # Sleep until the Arduino sends something instead of polling, every
+                # byte already received was turned into packets last time around
+                self._arduino.wait_for_data()
 
             # Read all available packets
             packets = self._arduino.read_all_packets()
 
-            if (len(packets) > 0):
+            if len(packets) > 0 and LOG_LEVEL_TO_SEE <= 1:
                 Utilities.print_with_indent_and_log_level(f"Packets: {packets}", 1)
 
             for packet in packets:
 
-                Utilities.print_with_indent_and_log_level(f"Received packet: {packet}", 2)
+                if LOG_LEVEL_TO_SEE <= 2:
+                    Utilities.print_with_indent_and_log_level(f"Received packet: {packet}", 2)
                 ptype = packet.get('type')
 
                 if ptype == 'line':
@@ -146,7 +177,8 @@ class SerialCommunicationToArduino:
 
                 elif ptype == 'key':
                     key = packet['key']
-                    Utilities.print_with_indent(f"Key received: 0x{key:02X}")
+                    if LOG_LEVEL_TO_SEE <= 3:
+                        Utilities.print_with_indent(f"Key received: 0x{key:02X}")
 
                     # Process key through handler
                     result = keyboard_handler.process_key(key)
@@ -155,7 +187,7 @@ class SerialCommunicationToArduino:
                         # Modifier key, ignore
                         continue
 
-                    elif isinstance(result, dict):
+                    elif isinstance(result, Mapping):
                         # Action to execute
                         if result.get("action") == "enter":
                             return {"type": "command", "value": command}
@@ -163,7 +195,10 @@ class SerialCommunicationToArduino:
                         elif result.get("action") == "backspace":
                             if len(command) > 0:
                                 command = command[:-1]
+                                # deleting gets drawn right away
                                 self.update_prompt(command + " ", font_id)
+                                pending_prompt = None
+                                last_prompt_redraw = time.monotonic()
 
                         else:
                             # Return action (font change, clear, etc)
@@ -172,7 +207,7 @@ class SerialCommunicationToArduino:
                     elif isinstance(result, str):
                         # Regular character
                         command += result
-                        self.update_prompt(command + " ", font_id)
+                        pending_prompt = command + " "
 
                 elif ptype == 'debug':
                     Utilities.print_with_indent(f"[DUINO DEBUG] {packet['message']}")
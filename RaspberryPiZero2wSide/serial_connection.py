@@ -5,7 +5,11 @@ This module handles the raw serial communication with the Arduino,
 including the signal pin handshaking for soft serial mode.
 """
 
+import os
+import selectors
+import threading
 import time
+from collections import deque
 import serial
 import pigpio
 
@@ -15,6 +19,7 @@ from config import (
     USING_SOFT_SERIAL,
     TIMEOUT_WAITING_FOR_SIGNAL_TO_TRANSFER,
     SIGNAL_PIN_NUMBER_ON_GPIO_NUMBERING,
+    LOG_LEVEL_TO_SEE,
 )
 from protocol import PacketParser
 from utilities import Utilities
@@ -38,15 +43,41 @@ class ArduinoSerial:
         """
         self._pi = pigpio.pi()
 
+        # pigpio calls back when the Arduino pulls the signal pin LOW, send()
+        # sleeps on this event instead of polling the pin. Only soft serial
+        # uses the signal pin.
+        self._signal_low = threading.Event()
+        self._pi.set_mode(SIGNAL_PIN_NUMBER_ON_GPIO_NUMBERING, pigpio.INPUT)
+        self._signal_callback = None
+        if USING_SOFT_SERIAL:
+            self._signal_callback = self._pi.callback(
+                SIGNAL_PIN_NUMBER_ON_GPIO_NUMBERING, pigpio.FALLING_EDGE,
+                lambda gpio, level, tick: self._signal_low.set())
+
         if USING_SOFT_SERIAL:
             self._ser = serial.Serial(serial_port, baudrate=BAUD_RATE_SOFT_SERIAL)
         else:
             self._ser = serial.Serial(serial_port, baudrate=BAUD_RATE_HARDWARE_SERIAL)
 
+        # Read straight from the fd, pyserial's read() adds a few Python layers
+        # per call. Non blocking so a read returns whatever is waiting.
+        self._fd = self._ser.fileno()
+        os.set_blocking(self._fd, False)
+
         self._parser = PacketParser()
+        # Packets already parsed from a bulk read but not handed out yet
+        self._packets = deque()
+        # Created on first wait_for_data(), watches the serial fd for input
+        self._selector = None
 
     def close(self):
         """Close serial connection and GPIO"""
+        if self._selector:
+            self._selector.close()
+            self._selector = None
+        if self._signal_callback:
+            self._signal_callback.cancel()
+            self._signal_callback = None
         if self._ser:
             self._ser.close()
         if self._pi:
@@ -57,6 +88,29 @@ class ArduinoSerial:
         """Number of bytes waiting to be read"""
         return self._ser.in_waiting
 
+    def fileno(self) -> int:
+        """File descriptor of the serial port, for select/poll"""
+        return self._fd
+
+    def wait_for_data(self, timeout: float = None) -> bool:
+        """
+        Sleep until the Arduino sends something.
+
+        Args:
+            timeout: Maximum time to wait in seconds, None waits forever
+
+        Returns:
+            True if there is data to read, False if timeout
+        """
+        if self._packets:
+            return True
+
+        if self._selector is None:
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.fileno(), selectors.EVENT_READ)
+
+        return bool(self._selector.select(timeout))
+
     def send(self, data: bytes) -> bool:
         """
         Send data to Arduino.
@@ -70,24 +124,26 @@ class ArduinoSerial:
             True if sent successfully, False if timeout waiting for signal
         """
         if USING_SOFT_SERIAL:
-            start_time = time.time()
-
-            while True:
-                elapsed = time.time() - start_time
-
-                if elapsed >= TIMEOUT_WAITING_FOR_SIGNAL_TO_TRANSFER:
+            deadline = time.monotonic() + TIMEOUT_WAITING_FOR_SIGNAL_TO_TRANSFER
+
+            # Cleared before reading the pin, so an edge right after the read
+            # still wakes the wait up
+            self._signal_low.clear()
+
+            # The Arduino only listens while the pin is LOW, and it pulses LOW on
+            # every loop, an edge can be from a window that already closed. The
+            # pin is read again after every wake up, only a LOW pin means go.
+            while self._pi.read(SIGNAL_PIN_NUMBER_ON_GPIO_NUMBERING) != 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._signal_low.wait(remaining):
                     Utilities.print_with_indent_and_log_level(
                         "TIMEOUT waiting to send message to duino", 2)
                     return False
+                self._signal_low.clear()
 
-                signal_line = self._pi.read(SIGNAL_PIN_NUMBER_ON_GPIO_NUMBERING)
-                if signal_line == 0:
-                    self._ser.write(data)
-                    Utilities.print_with_indent_and_log_level("SENT message to duino using soft serial", 2)
-                    return True
-
-                # Small delay to avoid busy-waiting
-                time.sleep(0.0001)
+            self._ser.write(data)
+            Utilities.print_with_indent_and_log_level("SENT message to duino using soft serial", 2)
+            return True
         else:
             self._ser.write(data)
             return True
@@ -107,12 +163,10 @@ class ArduinoSerial:
             - {'type': 'error', 'reason': str}
             - {'type': 'unknown', 'byte': int}
         """
-        while self._ser.in_waiting > 0:
-            byte = self._ser.read(1)[0]
-            packet = self._parser.feed(byte)
-            if packet:
-                return packet
-        return None
+        if not self._packets:
+            self._read_available()
+
+        return self._packets.popleft() if self._packets else None
 
     def read_all_packets(self) -> list:
         """
@@ -121,47 +175,83 @@ class ArduinoSerial:
         Returns:
             List of parsed packet dicts
         """
-        packets = []
-        while True:
-            packet = self.read_packet()
-            if packet is None:
-                break
-            packets.append(packet)
+        self._read_available()
+
+        packets = list(self._packets)
+        self._packets.clear()
         return packets
 
+    def _read_available(self):
+        """
+        Read everything waiting on the port in one call and parse it.
+
+        Complete packets are queued in self._packets, packets past the first
+        one a caller wants are kept there for the next call.
+        """
+        try:
+            # more than the kernel tty buffer holds, so one read gets it all
+            chunk = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+
+        # the fd stays readable after a hangup, returning here would turn every
+        # wait_for_data() into a busy loop, fail like pyserial's read() does
+        if not chunk:
+            raise serial.SerialException("device disconnected")
+
+        self._packets.extend(self._parser.feed_bytes(chunk))
+
     def wait_for_ready(self, timeout: float = 1.0, process_callback=None) -> bool:
         """
         Wait for Arduino ready signal.
 
         Args:
             timeout: Maximum time to wait in seconds
-            process_callback: Optional callback(packet) for non-ready packets
+            process_callback: Optional callback(packet) for non-ready packets.
+                Without one they are kept and handed out by the next reads, so
+                keys typed while the screen updates aren't lost.
 
         Returns:
             True if ready signal received, False if timeout
         """
-        start_time = time.time()
+        deferred = []
+        try:
+            return self._wait_for_ready(timeout, process_callback, deferred)
+        finally:
+            # back in front of anything read after them, in the order they came
+            self._packets.extendleft(reversed(deferred))
+
+    def _wait_for_ready(self, timeout: float, process_callback, deferred: list) -> bool:
+        """wait_for_ready(), collecting unhandled packets in deferred"""
+        start_time = time.monotonic()
+        deadline = start_time + timeout
 
         while True:
-            if time.time() - start_time > timeout:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
                 Utilities.print_with_indent_and_log_level(
                     "[WARNING]: timeout waiting for ready signal!", 4)
                 return False
 
             packet = self.read_packet()
 
-            if packet:
-                if packet['type'] == 'ready':
-                    elapsed = time.time() - start_time
+            if packet is None:
+                # sleep until bytes arrive instead of polling, at most until the deadline
+                self.wait_for_data(remaining)
+                continue
+
+            if packet['type'] == 'ready':
+                if LOG_LEVEL_TO_SEE <= 4:
+                    elapsed = time.monotonic() - start_time
                     Utilities.print_with_indent_and_log_level(
                         f"Receive READY, took: {elapsed:.4f} seconds", 4)
-                    return True
-                if packet['type'] == 'debug':
-                    Utilities.print_with_indent(f"[DUINO DEBUG] {packet['message']}")
-                elif process_callback:
-                    process_callback(packet)
-
-            Utilities.delay_to_not_bog_cpu()
+                return True
+            if packet['type'] == 'debug':
+                Utilities.print_with_indent(f"[DUINO DEBUG] {packet['message']}")
+            elif process_callback:
+                process_callback(packet)
+            else:
+                deferred.append(packet)
 
     def flush_input(self):
         """Flush any pending input data"""
@@ -1,19 +1,19 @@
 import datetime
 import subprocess
+from itertools import chain, zip_longest
 from types import FrameType
 from typing import Optional
 import sys
-import time
 
 import utility_pydate
 from config import LOG_LEVEL_TO_SEE
 
+# written before every command so the new output can be told apart from the old one
+SEPARATOR = sys.intern("=========================")
+SEPARATOR_LENGTH = len(SEPARATOR)
 
-class Utilities:
 
-    @staticmethod
-    def delay_to_not_bog_cpu() -> None:
-        time.sleep(0.001)
+class Utilities:
 
     @staticmethod
     def print_with_indent(msg: str) -> None:
@@ -40,10 +40,22 @@ class Utilities:
 
     @staticmethod
     def trim_trailing_empty(lines: list[str]) -> list[str]:
-        while lines and lines[-1].strip() == "":
+        # only looks at the trailing blank lines, an already trimmed list costs one check,
+        # isspace() answers the same as strip() without building a new string
+        while lines and (not lines[-1] or lines[-1].isspace()):
             lines.pop()
         return lines
 
+    @staticmethod
+    def lines_after_last_separator(lines: list[str]) -> list[str]:
+        """Lines after the last SEPARATOR line, all of them if there is none"""
+        # walk backwards to the last separator, no reversed copy of the list needed
+        for i in range(len(lines) - 1, -1, -1):
+            line = lines[i]
+            if len(line) == SEPARATOR_LENGTH and line == SEPARATOR:
+                return lines[i + 1:]
+        return lines
+
     @staticmethod
     def print_lines(old_lines, lines_to_print,
                     message: str = "self.lines(old) vs lines_to_print (new)"):
@@ -54,32 +66,27 @@ class Utilities:
         if lines_to_print is None:
             lines_to_print = []
 
-        Utilities.print_with_indent(f"{message}")
-        max_length_string = 0
-        for i in range(max(len(old_lines), len(lines_to_print))):
-            if i <= len(lines_to_print) - 1:
-                max_length_string = max(max_length_string, len(lines_to_print[i]))
-
-            if i <= len(old_lines) - 1:
-                max_length_string = max(max_length_string, len(old_lines[i]))
-
-        for i in range(max(len(old_lines), len(lines_to_print))):
-            new = "--no record--"
-            old = "--no record--"
-            if i <= len(lines_to_print) - 1:
-                if lines_to_print[i].strip() == "":
-                    new = "--empty line--"
-                else:
-                    new = lines_to_print[i]
+        # everything below is debug level, don't format a whole history for nothing
+        if 2 < LOG_LEVEL_TO_SEE:
+            return
 
-            if i <= len(old_lines) - 1:
-                if old_lines[i].strip() == "":
-                    old = "--empty line--"
-                else:
-                    old = old_lines[i]
+        Utilities.print_with_indent_and_log_level(f"{message}", 2)
+        max_length_string = max(map(len, chain(old_lines, lines_to_print)), default=0)
+
+        # walked in step instead of indexed, old_lines is usually the history deque
+        for old, new in zip_longest(old_lines, lines_to_print):
+            if new is None:
+                new = "--no record--"
+            elif new.strip() == "":
+                new = "--empty line--"
+
+            if old is None:
+                old = "--no record--"
+            elif old.strip() == "":
+                old = "--empty line--"
 
             Utilities.print_with_indent_and_log_level(
-                f"  '{old.ljust(max_length_string)}'  -  '{new.ljust(max_length_string)}'", 3)
+                f"  '{old.ljust(max_length_string)}'  -  '{new.ljust(max_length_string)}'", 2)
 
     # prints the "font" used by the smartxe library
     @staticmethod